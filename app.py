@@ -1,10 +1,21 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, abort, stream_with_context
 from flask_pymongo import PyMongo
+from flask_pymongo.helpers import BSONObjectIdConverter
+import click
+import hashlib
+import sys
+import pymongo
+from pymongo.errors import PyMongoError
 from dotenv import load_dotenv
 import os
 
 from models.user_model import UserModel
 from models.task_model import TaskModel
+from security import PasswordHasher, LoginThrottle, MongoFailureStore
+from metrics import Metrics
+from cache import TTLCache
+import task_io
+from sessions import MemorySessionStore, MongoSessionStore, ServerSideSessionInterface
 
 # Load environment variables from .env file
 load_dotenv()
@@ -18,10 +29,155 @@ app.secret_key = os.getenv("SECRET_KEY")
 # MongoDB configuration
 app.config["MONGO_URI"] = os.getenv("MONGO_URI")
 
-# Initialize PyMongo and models
-mongo = PyMongo(app)
-user_model = UserModel(mongo)
-task_model = TaskModel(mongo)
+# MongoClient pool options, passed through only when set so the URI's own
+# options still apply otherwise
+MONGO_CLIENT_OPTIONS = {
+    "maxPoolSize": ("MONGO_MAX_POOL_SIZE", int),
+    "minPoolSize": ("MONGO_MIN_POOL_SIZE", int),
+    "maxIdleTimeMS": ("MONGO_MAX_IDLE_TIME_MS", int),
+    "connectTimeoutMS": ("MONGO_CONNECT_TIMEOUT_MS", int),
+    "socketTimeoutMS": ("MONGO_SOCKET_TIMEOUT_MS", int),
+    "serverSelectionTimeoutMS": ("MONGO_SERVER_SELECTION_TIMEOUT_MS", int),
+    "waitQueueTimeoutMS": ("MONGO_WAIT_QUEUE_TIMEOUT_MS", int),
+    "readPreference": ("MONGO_READ_PREFERENCE", str),
+}
+app.config["MONGO_CLIENT_OPTIONS"] = {
+    option: cast(os.getenv(env))
+    for option, (env, cast) in MONGO_CLIENT_OPTIONS.items()
+    if os.getenv(env)
+}
+
+# Seconds the readiness probe waits for MongoDB before reporting unavailable
+app.config["HEALTHZ_TIMEOUT"] = float(os.getenv("HEALTHZ_TIMEOUT", 2))
+
+# Dashboard pagination
+app.config["TASKS_PAGE_SIZE"] = int(os.getenv("TASKS_PAGE_SIZE", 20))
+app.config["TASKS_MAX_PAGE_SIZE"] = int(os.getenv("TASKS_MAX_PAGE_SIZE", 100))
+
+# Largest number of operations accepted by one batch request
+app.config["BATCH_MAX_OPERATIONS"] = int(os.getenv("BATCH_MAX_OPERATIONS", 1000))
+
+# Cursor batch size for exports and insert_many chunk size for imports
+app.config["EXPORT_BATCH_SIZE"] = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+app.config["IMPORT_CHUNK_SIZE"] = int(os.getenv("IMPORT_CHUNK_SIZE", 1000))
+
+# Password hashing and login throttling
+app.config["PASSWORD_HASH_METHOD"] = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+app.config["PASSWORD_HASH_WORKERS"] = int(os.getenv("PASSWORD_HASH_WORKERS", 0))
+app.config["PASSWORD_HASH_TIMEOUT"] = float(os.getenv("PASSWORD_HASH_TIMEOUT", 30))
+app.config["LOGIN_MAX_FAILURES"] = int(os.getenv("LOGIN_MAX_FAILURES", 5))
+app.config["LOGIN_MAX_FAILURES_PER_IP"] = int(os.getenv("LOGIN_MAX_FAILURES_PER_IP", 50))
+app.config["LOGIN_FAILURE_WINDOW"] = int(os.getenv("LOGIN_FAILURE_WINDOW", 300))
+app.config["LOGIN_NEGATIVE_CACHE_TTL"] = int(os.getenv("LOGIN_NEGATIVE_CACHE_TTL", 60))
+# Where failed-login counters live: "mongo" shares them between all workers,
+# "memory" keeps them per worker process, so with N workers the effective
+# limits are N times the ones above. The negative cache is always per worker.
+app.config["LOGIN_THROTTLE_BACKEND"] = os.getenv("LOGIN_THROTTLE_BACKEND", "mongo")
+
+# Sessions: "cookie" keeps Flask's signed cookie sessions, "mongo" stores
+# them server side in a TTL collection, "memory" in this process only
+app.config["SESSION_BACKEND"] = os.getenv("SESSION_BACKEND", "cookie")
+app.config["SESSION_LIFETIME"] = int(os.getenv("SESSION_LIFETIME", 7 * 24 * 3600))
+app.config["SESSION_CACHE_TTL"] = int(os.getenv("SESSION_CACHE_TTL", 30))
+app.config["SESSION_CACHE_SIZE"] = int(os.getenv("SESSION_CACHE_SIZE", 10000))
+app.config["USER_CACHE_TTL"] = int(os.getenv("USER_CACHE_TTL", 60))
+app.config["USER_CACHE_SIZE"] = int(os.getenv("USER_CACHE_SIZE", 10000))
+
+# Request and Mongo command instrumentation
+app.config["METRICS_SAMPLE_RATE"] = float(os.getenv("METRICS_SAMPLE_RATE", 1.0))
+app.config["METRICS_SLOW_QUERY_MS"] = float(os.getenv("METRICS_SLOW_QUERY_MS", 100))
+app.config["METRICS_SERVER_TIMING"] = os.getenv("METRICS_SERVER_TIMING", "").lower() in ("1", "true", "yes")
+
+metrics = Metrics(
+    sample_rate=app.config["METRICS_SAMPLE_RATE"],
+    slow_query_ms=app.config["METRICS_SLOW_QUERY_MS"],
+    server_timing=app.config["METRICS_SERVER_TIMING"],
+)
+metrics.init_app(app)
+
+# PyMongo and the models are set up by create_app(), so that under a
+# pre-forking server each worker builds its own MongoClient after fork
+mongo = PyMongo()
+user_model = None
+task_model = None
+
+# Routes use the <ObjectId:...> converter before PyMongo registers it
+app.url_map.converters["ObjectId"] = BSONObjectIdConverter
+
+password_hasher = PasswordHasher(
+    app.config["PASSWORD_HASH_METHOD"],
+    app.config["PASSWORD_HASH_WORKERS"],
+    app.config["PASSWORD_HASH_TIMEOUT"],
+)
+login_throttle = LoginThrottle(
+    max_failures=app.config["LOGIN_MAX_FAILURES"],
+    max_failures_per_ip=app.config["LOGIN_MAX_FAILURES_PER_IP"],
+    window=app.config["LOGIN_FAILURE_WINDOW"],
+    negative_ttl=app.config["LOGIN_NEGATIVE_CACHE_TTL"],
+)
+
+def create_app():
+    """
+    Connects the app to MongoDB and returns it. Safe to call more than once;
+    only the first call in a process does the setup.
+    """
+    global user_model, task_model
+    if task_model is not None:
+        return app
+
+    mongo.init_app(
+        app,
+        event_listeners=[metrics.command_listener],
+        **app.config["MONGO_CLIENT_OPTIONS"],
+    )
+    user_cache = TTLCache(app.config["USER_CACHE_TTL"], app.config["USER_CACHE_SIZE"])
+    user_model = UserModel(mongo, password_hasher, user_cache)
+    task_model = TaskModel(mongo)
+
+    session_store = None
+    if app.config["SESSION_BACKEND"] == "mongo":
+        session_store = MongoSessionStore(mongo.db.sessions)
+    elif app.config["SESSION_BACKEND"] == "memory":
+        session_store = MemorySessionStore()
+    if session_store is not None:
+        app.session_interface = ServerSideSessionInterface(
+            session_store,
+            app.config["SESSION_LIFETIME"],
+            TTLCache(app.config["SESSION_CACHE_TTL"], app.config["SESSION_CACHE_SIZE"]),
+        )
+
+    if app.config["LOGIN_THROTTLE_BACKEND"] == "mongo":
+        login_throttle.failures = MongoFailureStore(
+            mongo.db.login_failures, app.config["LOGIN_FAILURE_WINDOW"]
+        )
+
+    # Create the indexes the queries rely on
+    for model in (task_model, user_model, session_store, login_throttle.failures):
+        if model is None:
+            continue
+        try:
+            model.create_indexes()
+        except PyMongoError as e:
+            if model is user_model:
+                app.logger.error(
+                    "Could not create the unique users.username index: %s. Signup falls back "
+                    "to a racy duplicate check; remove duplicate usernames and restart.", e
+                )
+            else:
+                app.logger.warning("Could not create %s indexes: %s", type(model).__name__, e)
+    return app
+
+def shutdown():
+    # Release pooled connections and hashing processes when a worker exits
+    if mongo.cx is not None:
+        mongo.cx.close()
+    password_hasher.shutdown()
+
+# Drop sessions of users that no longer exist (served from the user cache)
+@app.before_request
+def validate_session_user():
+    if "user" in session and user_model is not None and not user_model.find_by_username(session["user"]):
+        session.clear()
 
 # Home route redirects to login
 @app.route("/")
@@ -40,11 +196,11 @@ def signup():
             flash("Passwords do not match!")
             return redirect(url_for("signup"))
 
-        if user_model.find_by_username(username):
+        # The unique index on username rejects duplicates in the same round trip
+        if not user_model.create_user(username, password):
             flash("Username already exists!")
             return redirect(url_for("signup"))
 
-        user_model.create_user(username, password)
         flash("Signup successful! Please login.")
         return redirect(url_for("login"))
 
@@ -56,11 +212,21 @@ def login():
     if request.method == "POST":
         username = request.form["username"]
         password = request.form["password"]
+        ip = request.remote_addr
 
-        if user_model.verify_user(username, password):
+        if login_throttle.is_blocked(username, ip):
+            error = "Too many failed login attempts. Please try again later."
+            return render_template("login.html", error=error), 429
+
+        # Repeats of a recently failed attempt are rejected without hashing
+        if not login_throttle.is_known_bad(username, password) and user_model.verify_user(username, password):
+            login_throttle.record_success(username, ip)
             session["user"] = username
             return redirect(url_for("dashboard"))
         else:
+            # Only misses against existing users are remembered (the lookup is cached)
+            user_exists = user_model.find_by_username(username) is not None
+            login_throttle.record_failure(username, ip, password, remember_attempt=user_exists)
             error = "Invalid username or password"
             return render_template("login.html", error=error)
 
@@ -73,16 +239,36 @@ def logout():
     flash("You have been logged out.")
     return redirect(url_for("login"))
 
+def requested_page_size():
+    page_size = request.args.get("page_size", app.config["TASKS_PAGE_SIZE"], type=int)
+    return max(1, min(page_size, app.config["TASKS_MAX_PAGE_SIZE"]))
+
 # Dashboard route
 @app.route("/dashboard")
 def dashboard():
     if "user" not in session:
         return redirect(url_for("login"))
 
-    tasks = task_model.get_tasks(session["user"])
-    completion = task_model.get_completion_percentage(tasks)
+    page_size = requested_page_size()
+
+    tasks, next_cursor, prev_cursor = task_model.get_tasks_page(
+        session["user"],
+        page_size,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+    )
+    stats = task_model.get_stats(session["user"])
+    completion = task_model.get_completion_percentage(stats)
 
-    return render_template("dashboard.html", tasks=tasks, completion_percentage=completion)
+    return render_template(
+        "dashboard.html",
+        tasks=tasks,
+        completion_percentage=completion,
+        overdue_count=stats["overdue"],
+        page_size=page_size,
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
+    )
 
 # Add task route
 @app.route("/add", methods=["POST"])
@@ -98,17 +284,191 @@ def add_task():
     return redirect(url_for("dashboard"))
 
 # Mark task as complete
-@app.route("/complete/<task_id>")
+@app.route("/complete/<ObjectId:task_id>")
 def complete_task(task_id):
-    task_model.complete_task(task_id)
+    if "user" in session:
+        task_model.complete_task(task_id, session["user"])
     return redirect(url_for("dashboard"))
 
 # Delete task
-@app.route("/delete/<task_id>")
+@app.route("/delete/<ObjectId:task_id>")
 def delete_task(task_id):
-    task_model.delete_task(task_id)
+    if "user" in session:
+        task_model.delete_task(task_id, session["user"])
     return redirect(url_for("dashboard"))
 
-# Run the app
+# JSON task list, answering conditional GETs from the user's version counter
+@app.route("/api/tasks")
+def api_tasks():
+    if "user" not in session:
+        return jsonify(error="Login required"), 401
+
+    completed = request.args.get("completed")
+    if completed is not None:
+        completed = completed.lower() in ("1", "true", "yes")
+
+    # The ETag covers the query too, since each page/filter is a different response
+    version = task_model.get_version(session["user"])
+    etag = hashlib.sha1(
+        f"{session['user']}:{version}:{request.query_string.decode()}".encode()
+    ).hexdigest()
+    # If-None-Match uses weak comparison; proxies that compress weaken ETags
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        tasks, next_cursor, prev_cursor = task_model.get_tasks_page(
+            session["user"],
+            requested_page_size(),
+            after=request.args.get("after"),
+            before=request.args.get("before"),
+            completed=completed,
+        )
+        response = jsonify(
+            tasks=[task_model.serialize_task(task) for task in tasks],
+            next=next_cursor,
+            prev=prev_cursor,
+        )
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+# Batch add/complete/delete in one request
+@app.route("/api/tasks/batch", methods=["POST"])
+def batch_tasks():
+    if "user" not in session:
+        return jsonify(error="Login required"), 401
+
+    payload = request.get_json(silent=True)
+    operations = payload.get("operations") if isinstance(payload, dict) else None
+    if not isinstance(operations, list) or not all(isinstance(op, dict) for op in operations):
+        return jsonify(error="Expected a JSON object with an 'operations' list"), 400
+    if len(operations) > app.config["BATCH_MAX_OPERATIONS"]:
+        return jsonify(error=f"At most {app.config['BATCH_MAX_OPERATIONS']} operations per batch"), 413
+
+    results = task_model.bulk_tasks(session["user"], operations)
+    return jsonify(results=results)
+
+# Stream the user's tasks as CSV or NDJSON
+@app.route("/export/tasks.<fmt>")
+def export_tasks(fmt):
+    if "user" not in session:
+        return redirect(url_for("login"))
+    if fmt not in task_io.FORMATS:
+        abort(404)
+
+    tasks = task_model.iter_tasks(session["user"], app.config["EXPORT_BATCH_SIZE"])
+    response = app.response_class(
+        stream_with_context(task_io.export_chunks(task_model, tasks, fmt)),
+        mimetype=task_io.FORMATS[fmt],
+    )
+    response.headers["Content-Disposition"] = f"attachment; filename=tasks.{fmt}"
+    return response
+
+# Import tasks for the user from an uploaded file or the raw request body
+@app.route("/import/tasks", methods=["POST"])
+def import_tasks():
+    if "user" not in session:
+        return jsonify(error="Login required"), 401
+
+    upload = request.files.get("file")
+    if upload:
+        stream = upload.stream
+        fmt = request.args.get("format") or task_io.format_from_filename(upload.filename)
+    else:
+        stream = request.stream
+        fmt = request.args.get("format") or ("ndjson" if "ndjson" in (request.mimetype or "") else "csv")
+    if fmt not in task_io.FORMATS:
+        return jsonify(error=f"Unsupported format: {fmt}"), 400
+
+    rows = task_io.read_rows(task_io.decode_lines(stream), fmt)
+    result = task_model.import_tasks(rows, session["user"], app.config["IMPORT_CHUNK_SIZE"])
+    return jsonify(result), 400 if result["aborted"] else 200
+
+# Readiness probe: only healthy when MongoDB answers
+@app.route("/healthz")
+def healthz():
+    if mongo.cx is None:
+        return jsonify(status="starting"), 503
+    try:
+        # Bound the ping: server selection alone defaults to 30s when Mongo is down
+        with pymongo.timeout(app.config["HEALTHZ_TIMEOUT"]):
+            mongo.cx.admin.command("ping")
+    except PyMongoError as e:
+        app.logger.warning("Health check failed: %s", e)
+        return jsonify(status="unavailable"), 503
+    return jsonify(status="ok")
+
+# Prometheus scrape endpoint for this process's metrics
+@app.route("/metrics")
+def metrics_endpoint():
+    return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# Recount per-user task statistics
+@app.cli.command("rebuild-stats")
+@click.argument("username", required=False)
+def rebuild_stats(username):
+    """Rebuild task counters for USERNAME, or for every user."""
+    create_app()
+    if username:
+        stats = task_model.rebuild_stats(username)
+        click.echo(f"{username}: {stats['completed']}/{stats['total']} completed, {stats['overdue']} overdue")
+    else:
+        click.echo(f"Rebuilt stats for {task_model.rebuild_stats()} users")
+
+# End all server-side sessions of a user
+@app.cli.command("revoke-sessions")
+@click.argument("username")
+def revoke_sessions(username):
+    """Log USERNAME out everywhere (server-side session backends only)."""
+    create_app()
+    if not isinstance(app.session_interface, ServerSideSessionInterface):
+        raise click.ClickException("SESSION_BACKEND must be 'mongo' to revoke sessions")
+    click.echo(f"Revoked {app.session_interface.revoke_user(username)} sessions")
+
+# Export tasks from the command line
+@app.cli.command("export-tasks")
+@click.option("--user", "username", help="Only this user's tasks (default: all tasks).")
+@click.option("--format", "fmt", type=click.Choice(list(task_io.FORMATS)), default="csv")
+@click.option("--output", type=click.File("w"), default="-", help="Output file (default: stdout).")
+def export_tasks_command(username, fmt, output):
+    """Stream tasks as CSV or NDJSON."""
+    create_app()
+    tasks = task_model.iter_tasks(username, app.config["EXPORT_BATCH_SIZE"])
+    for chunk in task_io.export_chunks(task_model, tasks, fmt):
+        output.write(chunk)
+
+# Import tasks from the command line
+@app.cli.command("import-tasks")
+@click.argument("source", type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option("--user", "username", help="Import every row for this user (default: the row's username).")
+@click.option("--format", "fmt", type=click.Choice(list(task_io.FORMATS)), help="Defaults to the file extension.")
+@click.option("--chunk-size", type=int, help="Rows per insert_many.")
+def import_tasks_command(source, username, fmt, chunk_size):
+    """Import tasks from a CSV or NDJSON file ('-' for stdin)."""
+    create_app()
+    fmt = fmt or task_io.format_from_filename(source)
+
+    def progress(imported, failed, elapsed):
+        rate = (imported + failed) / elapsed if elapsed else 0
+        click.echo(f"{imported} imported, {failed} failed, {rate:.0f} rows/s", err=True)
+
+    # newline="" lets the csv module handle line breaks inside quoted fields
+    with (sys.stdin if source == "-" else open(source, encoding="utf-8", newline="")) as stream:
+        result = task_model.import_tasks(
+            task_io.read_rows(stream, fmt),
+            username,
+            chunk_size or app.config["IMPORT_CHUNK_SIZE"],
+            progress,
+        )
+    for error in result["errors"]:
+        click.echo(f"row {error['row']}: {error['error']}", err=True)
+    click.echo(
+        f"Imported {result['imported']} tasks ({result['failed']} failed) "
+        f"in {result['seconds']}s, {result['rows_per_second']} rows/s"
+    )
+    if result["aborted"]:
+        raise click.ClickException("import stopped early, the input could not be read past the last error")
+
+# Run the app with the development server; see wsgi.py for production
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000,debug=True)
+    create_app().run(host="0.0.0.0", port=5000,debug=True)
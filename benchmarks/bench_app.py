@@ -0,0 +1,356 @@
+"""
+Benchmark harness for the to-do app.
+
+Seeds one user per task count, then measures throughput and p50/p99
+latency of signup, login, dashboard render, the JSON task list, add,
+complete and delete, plus TaskModel.get_tasks / get_tasks_page directly.
+Requests go through the Flask test client and through a threaded HTTP
+server hit by concurrent urllib clients.
+
+Runs offline against mongomock by default, or against a real server with
+--mongo-uri (use a scratch database: it is dropped first).
+
+    python benchmarks/bench_app.py --task-counts 10,1000,100000 --output bench.json
+    python benchmarks/bench_app.py --compare bench.json --output new.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import queue
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.cookiejar import CookieJar
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+PASSWORD = "bench-password"
+SEED_BATCH = 10000
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--task-counts", default="10,1000,10000",
+                        help="comma-separated tasks per seeded user (default: %(default)s)")
+    parser.add_argument("--iterations", type=int, default=200,
+                        help="requests per scenario and driver (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="client threads for the HTTP driver (default: %(default)s)")
+    parser.add_argument("--drivers", default="test_client,http",
+                        help="comma-separated drivers to run (default: %(default)s)")
+    parser.add_argument("--mongo-uri", help="benchmark a real MongoDB instead of mongomock")
+    parser.add_argument("--hash-method", default="pbkdf2:sha256:1000",
+                        help="password hash method; the default is deliberately cheap (default: %(default)s)")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="previous results JSON to compare p50/p99 against")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="fail when a latency grows by more than this fraction (default: %(default)s)")
+    return parser.parse_args(argv)
+
+
+def load_app(args):
+    # The app reads its configuration from the environment at import time
+    os.environ["MONGO_URI"] = args.mongo_uri or "mongodb://localhost:27017/todo_bench"
+    os.environ["PASSWORD_HASH_METHOD"] = args.hash_method
+    os.environ.setdefault("SECRET_KEY", "bench")
+    # Every request comes from one IP and some logins are repeated, so keep
+    # the login throttle out of the measurements
+    os.environ["LOGIN_MAX_FAILURES_PER_IP"] = str(10 ** 9)
+
+    if not args.mongo_uri:
+        import flask_pymongo
+        import mongomock
+        flask_pymongo.MongoClient = mongomock.MongoClient
+
+    import app as todo_app
+    todo_app.create_app()
+    todo_app.mongo.db.client.drop_database(todo_app.mongo.db.name)
+    todo_app.task_model.create_indexes()
+    return todo_app
+
+
+def seed_user(todo_app, username, task_count):
+    todo_app.user_model.create_user(username, PASSWORD)
+    task_model = todo_app.task_model
+    start = datetime.now() - timedelta(days=task_count // 2)
+    for offset in range(0, task_count, SEED_BATCH):
+        batch = []
+        for i in range(offset, min(offset + SEED_BATCH, task_count)):
+            task = task_model.new_task(username, f"Task {i}")
+            task["start_date"] = start + timedelta(hours=i)
+            task["end_date"] = start + timedelta(hours=i, minutes=30)
+            task["completed"] = i % 3 == 0
+            batch.append(task)
+        task_model.tasks.insert_many(batch, ordered=False)
+    task_model.rebuild_stats(username)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class TestClientDriver:
+    """Calls the app in-process through Flask's test client."""
+
+    name = "test_client"
+
+    def __init__(self, todo_app):
+        self.client = todo_app.app.test_client()
+
+    def request(self, method, path, data=None):
+        return self.client.open(path, method=method, data=data).status_code
+
+
+class HttpDriver:
+    """One HTTP client with its own cookie jar, not following redirects."""
+
+    name = "http"
+
+    class _NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(CookieJar()), self._NoRedirect
+        )
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def serve(todo_app):
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, todo_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def run_scenario(make_driver, concurrency, iterations, username, call):
+    """
+    Runs `iterations` calls of call(driver, i) over `concurrency` logged-in
+    drivers and returns the timing summary.
+    """
+    drivers = [make_driver() for _ in range(concurrency)]
+    if username:
+        for driver in drivers:
+            driver.request("POST", "/login", {"username": username, "password": PASSWORD})
+
+    work = queue.Queue()
+    for i in range(iterations):
+        work.put(i)
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def worker(driver):
+        nonlocal errors
+        while True:
+            try:
+                i = work.get_nowait()
+            except queue.Empty:
+                return
+            started = time.perf_counter()
+            status = call(driver, i)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                errors += status >= 400
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, drivers))
+    wall = time.perf_counter() - started
+    return summarize(latencies, errors, wall)
+
+
+def time_calls(iterations, call):
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_started = time.perf_counter()
+        call(i)
+        latencies.append(time.perf_counter() - call_started)
+    return summarize(latencies, 0, time.perf_counter() - started)
+
+
+def summarize(latencies, errors, wall):
+    latencies.sort()
+    ms = lambda seconds: None if seconds is None else round(seconds * 1000, 3)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else None,
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "p50_ms": ms(percentile(latencies, 0.50)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+    }
+
+
+def task_ids(todo_app, username, count, completed=False):
+    cursor = todo_app.task_model.tasks.find(
+        {"username": username, "completed": completed}, {"_id": 1}
+    ).limit(count)
+    ids = queue.Queue()
+    for task in cursor:
+        ids.put(str(task["_id"]))
+    return ids
+
+
+def benchmark_driver(todo_app, driver_name, make_driver, concurrency, iterations, task_counts, run_id):
+    results = []
+
+    def record(scenario, tasks_per_user, summary):
+        results.append(dict(driver=driver_name, scenario=scenario, tasks_per_user=tasks_per_user, **summary))
+        print(f"{driver_name:>11} {scenario:<15} {str(tasks_per_user):>7} tasks  "
+              f"{summary['throughput_rps']:>9} req/s  p50 {summary['p50_ms']} ms  "
+              f"p99 {summary['p99_ms']} ms  errors {summary['errors']}", flush=True)
+
+    record("signup", None, run_scenario(make_driver, concurrency, iterations, None, lambda d, i: d.request(
+        "POST", "/signup",
+        {"username": f"signup-{run_id}-{driver_name}-{i}", "password": PASSWORD, "confirm_password": PASSWORD},
+    )))
+
+    for task_count in task_counts:
+        username = f"bench-{task_count}"
+        record("login", task_count, run_scenario(make_driver, concurrency, iterations, None, lambda d, i: d.request(
+            "POST", "/login", {"username": username, "password": PASSWORD},
+        )))
+        record("dashboard", task_count, run_scenario(
+            make_driver, concurrency, iterations, username, lambda d, i: d.request("GET", "/dashboard"),
+        ))
+        record("api_tasks", task_count, run_scenario(
+            make_driver, concurrency, iterations, username, lambda d, i: d.request("GET", "/api/tasks"),
+        ))
+        record("add", task_count, run_scenario(make_driver, concurrency, iterations, username, lambda d, i: d.request(
+            "POST", "/add", {"task": f"Added {i}", "start_time": "2024-01-01T09:00", "end_time": "2024-01-01T10:00"},
+        )))
+
+        pending = task_ids(todo_app, username, iterations, completed=False)
+        record("complete", task_count, run_scenario(
+            make_driver, concurrency, min(iterations, pending.qsize()), username,
+            lambda d, i: d.request("GET", f"/complete/{pending.get_nowait()}"),
+        ))
+        removable = task_ids(todo_app, username, iterations, completed=True)
+        record("delete", task_count, run_scenario(
+            make_driver, concurrency, min(iterations, removable.qsize()), username,
+            lambda d, i: d.request("GET", f"/delete/{removable.get_nowait()}"),
+        ))
+    return results
+
+
+def benchmark_model(todo_app, iterations, task_counts):
+    results = []
+    task_model = todo_app.task_model
+    for task_count in task_counts:
+        username = f"bench-{task_count}"
+        # get_tasks loads everything, so cap its repetitions on big users
+        repeats = max(1, min(iterations, 1000000 // max(task_count, 1)))
+        for scenario, repeat, call in (
+            ("get_tasks", repeats, lambda i: task_model.get_tasks(username)),
+            ("get_tasks_page", iterations, lambda i: task_model.get_tasks_page(
+                username, todo_app.app.config["TASKS_PAGE_SIZE"])),
+        ):
+            summary = time_calls(repeat, call)
+            results.append(dict(driver="model", scenario=scenario, tasks_per_user=task_count, **summary))
+            print(f"{'model':>11} {scenario:<15} {task_count:>7} tasks  p50 {summary['p50_ms']} ms  "
+                  f"p99 {summary['p99_ms']} ms", flush=True)
+    return results
+
+
+def compare(results, baseline, max_regression):
+    """
+    Prints latency changes against a previous run and returns the rows
+    that regressed by more than max_regression.
+    """
+    previous = {
+        (row["driver"], row["scenario"], row["tasks_per_user"]): row for row in baseline["results"]
+    }
+    regressions = []
+    for row in results:
+        old = previous.get((row["driver"], row["scenario"], row["tasks_per_user"]))
+        if not old:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            if not old[metric] or row[metric] is None:
+                continue
+            change = row[metric] / old[metric] - 1
+            if change > max_regression:
+                regressions.append((row, metric, change))
+                print(f"REGRESSION {row['driver']} {row['scenario']} {row['tasks_per_user']} "
+                      f"{metric}: {old[metric]} -> {row[metric]} ms ({change:+.0%})")
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    task_counts = [int(count) for count in args.task_counts.split(",") if count]
+    drivers = [name for name in args.drivers.split(",") if name]
+
+    todo_app = load_app(args)
+    print(f"Seeding users with {task_counts} tasks...", flush=True)
+    for task_count in task_counts:
+        seed_user(todo_app, f"bench-{task_count}", task_count)
+
+    run_id = int(time.time())
+    results = benchmark_model(todo_app, args.iterations, task_counts)
+    if "test_client" in drivers:
+        results += benchmark_driver(
+            todo_app, "test_client", lambda: TestClientDriver(todo_app),
+            1, args.iterations, task_counts, run_id,
+        )
+    if "http" in drivers:
+        server, base_url = serve(todo_app)
+        try:
+            results += benchmark_driver(
+                todo_app, "http", lambda: HttpDriver(base_url),
+                args.concurrency, args.iterations, task_counts, run_id,
+            )
+        finally:
+            server.shutdown()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "backend": "mongodb" if args.mongo_uri else "mongomock",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "task_counts": task_counts,
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "hash_method": args.hash_method,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,31 @@
+# Gunicorn settings for the production server, overridable from the environment
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+
+# Threaded workers: requests mostly wait on MongoDB, so a few threads per
+# process keep the CPU busy without needing many processes
+worker_class = "gthread"
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+# Never import the app in the master: each worker must create its own
+# MongoClient after fork
+preload_app = False
+
+accesslog = "-"
+errorlog = "-"
+
+
+def worker_exit(server, worker):
+    from app import shutdown
+    shutdown()
@@ -0,0 +1,208 @@
+import bisect
+import random
+import threading
+import time
+
+from flask import request
+from pymongo import monitoring
+
+# Latency buckets in seconds, shared by route and Mongo command timings
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DOCUMENT_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+# Reply fields that carry documents back to the client, per command
+CURSOR_BATCHES = ("firstBatch", "nextBatch")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), series):
+                    cumulative += count
+                    le = _format_labels(self.label_names, labels, [("le", bound)])
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                plain = _format_labels(self.label_names, labels)
+                lines.append(f"{self.name}_sum{plain} {series[-1]}")
+                lines.append(f"{self.name}_count{plain} {cumulative}")
+        return lines
+
+
+class CommandTimer(monitoring.CommandListener):
+    """
+    pymongo listener feeding Mongo command timings into a Metrics instance.
+    Events fire on the thread that issued the command, so they can be tied
+    to the request that thread is serving.
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.metrics.record_command(event.command_name, event.duration_micros, event.reply)
+
+    def failed(self, event):
+        self.metrics.record_command(event.command_name, event.duration_micros, None, failed=True)
+
+
+class Metrics:
+    """
+    Per-process request and Mongo command metrics, exposed in the
+    Prometheus text format.
+
+    Only a `sample_rate` fraction of requests is timed; Mongo commands are
+    recorded while a sampled request is running on the same thread. Each
+    gunicorn worker keeps its own numbers.
+    """
+
+    def __init__(self, sample_rate=1.0, slow_query_ms=100, server_timing=False):
+        self.sample_rate = sample_rate
+        self.slow_query_ms = slow_query_ms
+        self.server_timing = server_timing
+        self.command_listener = CommandTimer(self)
+        self._local = threading.local()
+
+        self.request_duration = Histogram(
+            "todo_http_request_duration_seconds", "Time spent handling a request.",
+            ("route", "method"), LATENCY_BUCKETS,
+        )
+        self.requests = Counter(
+            "todo_http_requests_total", "Sampled requests by response status.",
+            ("route", "method", "status"),
+        )
+        self.command_duration = Histogram(
+            "todo_mongo_command_duration_seconds", "Time spent in MongoDB commands.",
+            ("command",), LATENCY_BUCKETS,
+        )
+        self.command_failures = Counter(
+            "todo_mongo_command_failures_total", "MongoDB commands that failed.", ("command",),
+        )
+        self.slow_commands = Counter(
+            "todo_mongo_slow_commands_total", "MongoDB commands slower than the slow query threshold.",
+            ("command",),
+        )
+        self.documents_returned = Histogram(
+            "todo_mongo_documents_returned_per_request", "Documents MongoDB returned while handling a request.",
+            ("route",), DOCUMENT_BUCKETS,
+        )
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def record_command(self, command_name, duration_micros, reply, failed=False):
+        state = self._local
+        if not getattr(state, "sampled", False):
+            return
+        seconds = duration_micros / 1e6
+        labels = (command_name,)
+        self.command_duration.observe(labels, seconds)
+        if failed:
+            self.command_failures.inc(labels)
+        if duration_micros >= self.slow_query_ms * 1000:
+            self.slow_commands.inc(labels)
+
+        state.db_seconds += seconds
+        state.db_commands += 1
+        state.documents += self._count_documents(reply)
+
+    def render(self):
+        lines = []
+        for metric in (self.request_duration, self.requests, self.command_duration,
+                       self.command_failures, self.slow_commands, self.documents_returned):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _count_documents(self, reply):
+        if not reply:
+            return 0
+        cursor = reply.get("cursor")
+        if cursor:
+            for batch in CURSOR_BATCHES:
+                if batch in cursor:
+                    return len(cursor[batch])
+        # findAndModify returns the matched document as "value"
+        if reply.get("value") is not None:
+            return 1
+        return 0
+
+    def _before_request(self):
+        state = self._local
+        state.sampled = self.sample_rate >= 1 or random.random() < self.sample_rate
+        state.started = time.perf_counter()
+        state.db_seconds = 0.0
+        state.db_commands = 0
+        state.documents = 0
+
+    def _after_request(self, response):
+        state = self._local
+        if not getattr(state, "sampled", False):
+            return response
+        state.sampled = False
+
+        elapsed = time.perf_counter() - state.started
+        # Label by URL rule, not path, so task ids don't explode cardinality
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        self.request_duration.observe((route, request.method), elapsed)
+        self.requests.inc((route, request.method, str(response.status_code)))
+        self.documents_returned.observe((route,), state.documents)
+
+        if self.server_timing:
+            response.headers["Server-Timing"] = (
+                f'app;dur={elapsed * 1000:.1f}, '
+                f'db;dur={state.db_seconds * 1000:.1f};desc="{state.db_commands} commands"'
+            )
+        return response
@@ -1,40 +1,519 @@
 from bson import ObjectId
+from bson.errors import InvalidId
+from collections import Counter
 from datetime import datetime
+import itertools
+import time
+from pymongo import ASCENDING, DESCENDING, DeleteMany, ReturnDocument, UpdateMany
+from pymongo.errors import BulkWriteError
+
+# Only the fields the dashboard template renders
+TASK_LIST_FIELDS = ["task", "completed", "start_date", "end_date"]
+
+# Dashboard ordering: tasks due soonest first, ties broken by insertion order
+TASK_LIST_SORT = [("end_date", ASCENDING), ("_id", ASCENDING)]
+
+# Fields written by exports, and read back by imports (except _id)
+EXPORT_FIELDS = ["username", "task", "completed", "start_date", "end_date"]
+
+# Date format for exported rows; format_date parses it back
+EXPORT_DATE_FORMAT = "%Y-%m-%dT%H:%M"
+
+# Import errors kept for the report; the rest are only counted
+MAX_IMPORT_ERRORS = 100
 
 class TaskModel:
     def __init__(self, mongo):
         self.tasks = mongo.db.tasks
+        # One counter document per user: {_id: username, total, completed,
+        # version, epoch}. version is bumped by every write to the user's tasks
+        # and epoch is fixed when the document is created, so together they
+        # identify the current state of the task list.
+        self.stats = mongo.db.task_stats
+
+    def create_indexes(self):
+        # Backs the paginated dashboard listing (username + keyset on end_date/_id)
+        self.tasks.create_index(
+            [("username", ASCENDING), ("end_date", ASCENDING), ("_id", ASCENDING)]
+        )
+        # Same listing filtered by completion state
+        self.tasks.create_index(
+            [("username", ASCENDING), ("completed", ASCENDING),
+             ("end_date", ASCENDING), ("_id", ASCENDING)]
+        )
 
     def add_task(self, username, task_text, start_date=None, end_date=None):
+        task = self.new_task(username, task_text, start_date, end_date)
+        self.tasks.insert_one(task)
+        self._inc_stats(username, total=1)
+
+    def new_task(self, username, task_text, start_date=None, end_date=None):
         # If start_date or end_date are provided, make sure they are in proper datetime format
         if start_date:
             start_date = self.format_date(start_date)
         if end_date:
             end_date = self.format_date(end_date)
-        
-        task = {
+
+        return {
             "username": username,
             "task": task_text,
             "completed": False,
             "start_date": start_date,
             "end_date": end_date
         }
-        self.tasks.insert_one(task)
 
     def get_tasks(self, username):
         return list(self.tasks.find({"username": username}))
 
-    def complete_task(self, task_id):
-        self.tasks.update_one({"_id": ObjectId(task_id)}, {"$set": {"completed": True}})
+    def iter_tasks(self, username=None, batch_size=1000):
+        """
+        Yields one user's tasks (or every task when username is None)
+        through a batched cursor, so callers can stream any number of tasks
+        in constant memory.
+        """
+        if username is None:
+            cursor = self.tasks.find({}, EXPORT_FIELDS)
+        else:
+            cursor = self.tasks.find({"username": username}, EXPORT_FIELDS).sort(TASK_LIST_SORT)
+        return cursor.batch_size(batch_size)
+
+    def get_tasks_page(self, username, page_size, after=None, before=None, completed=None):
+        """
+        Returns one page of a user's tasks as (tasks, next_cursor, prev_cursor).
+
+        Pages are keyed on (end_date, _id) so each page is a bounded index
+        range scan, however many tasks the user has. Pass the cursor of a
+        previous result as `after` or `before` to move forward or backward.
+        """
+        query = {"username": username}
+        if completed is not None:
+            query["completed"] = completed
+
+        backward = before is not None and after is None
+        position = self.decode_cursor(before if backward else after)
+        if position:
+            query.update(self._cursor_filter(position, backward))
+
+        sort = TASK_LIST_SORT
+        if backward:
+            sort = [(field, DESCENDING) for field, _ in TASK_LIST_SORT]
+
+        # Fetch one extra document to know whether another page follows
+        tasks = list(
+            self.tasks.find(query, TASK_LIST_FIELDS).sort(sort).limit(page_size + 1)
+        )
+        has_more = len(tasks) > page_size
+        tasks = tasks[:page_size]
+
+        if backward:
+            tasks.reverse()
+            next_cursor = self.encode_cursor(tasks[-1]) if tasks else None
+            prev_cursor = self.encode_cursor(tasks[0]) if has_more else None
+        else:
+            next_cursor = self.encode_cursor(tasks[-1]) if has_more else None
+            prev_cursor = self.encode_cursor(tasks[0]) if position and tasks else None
+        return tasks, next_cursor, prev_cursor
+
+    def encode_cursor(self, task):
+        end_date = task.get("end_date")
+        # Full precision, so the keyset comparison never re-matches this task
+        end = end_date.isoformat() if end_date else "-"
+        return f"{end}_{task['_id']}"
+
+    def decode_cursor(self, cursor):
+        """
+        Parses a cursor produced by encode_cursor into (end_date, _id).
+        Returns None for a missing or malformed cursor.
+        """
+        if not cursor:
+            return None
+        try:
+            end, task_id = cursor.rsplit("_", 1)
+            end_date = None if end == "-" else datetime.fromisoformat(end)
+            return end_date, ObjectId(task_id)
+        except (ValueError, InvalidId):
+            return None
+
+    def _cursor_filter(self, position, backward):
+        # Tasks without an end date sort before all dated tasks, and range
+        # operators never match null, so that case is spelled out explicitly
+        end_date, task_id = position
+        id_op = "$lt" if backward else "$gt"
+        if end_date is None:
+            if backward:
+                return {"end_date": None, "_id": {"$lt": task_id}}
+            return {"$or": [
+                {"end_date": None, "_id": {"$gt": task_id}},
+                {"end_date": {"$ne": None}},
+            ]}
+        clauses = [
+            {"end_date": {id_op: end_date}},
+            {"end_date": end_date, "_id": {id_op: task_id}},
+        ]
+        if backward:
+            clauses.append({"end_date": None})
+        return {"$or": clauses}
+
+    def complete_task(self, task_id, username):
+        # Only an incomplete task changes the counters, so match on that and
+        # read back the previous state in the same round trip
+        task = self.tasks.find_one_and_update(
+            {"_id": ObjectId(task_id), "username": username, "completed": False},
+            {"$set": {"completed": True}},
+        )
+        if task:
+            self._inc_stats(username, **self._complete_deltas(task))
+
+    def delete_task(self, task_id, username):
+        task = self.tasks.find_one_and_delete({"_id": ObjectId(task_id), "username": username})
+        if task:
+            self._inc_stats(username, **self._delete_deltas(task))
+
+    def bulk_tasks(self, username, operations):
+        """
+        Applies a batch of mixed operations for one user and returns one
+        result dict per operation, in order.
+
+        Each operation is {"op": "add", "task": ..., "start_date": ..., "end_date": ...}
+        or {"op": "complete" | "delete", "id": ...}. Adds go out in a single
+        unordered insert_many, completes and deletes in a single unordered
+        bulk_write, and only tasks owned by `username` are touched. Counter
+        updates are based on the state read just before writing; a
+        concurrent change in between can drift them until rebuild_stats.
+        """
+        results = [None] * len(operations)
+        new_tasks = []   # (position, task document)
+        updates = {}     # task _id -> (position, op)
+
+        for position, operation in enumerate(operations):
+            op = operation.get("op")
+            if op == "add":
+                task_text = operation.get("task")
+                if not isinstance(task_text, str) or not task_text.strip():
+                    results[position] = {"ok": False, "error": "missing task text"}
+                    continue
+                task = self.new_task(username, task_text)
+                bad_date = self._set_dates(task, operation)
+                if bad_date:
+                    results[position] = {"ok": False, "error": f"invalid {bad_date}"}
+                    continue
+                new_tasks.append((position, task))
+            elif op in ("complete", "delete"):
+                try:
+                    task_id = ObjectId(operation.get("id"))
+                except (InvalidId, TypeError):
+                    results[position] = {"ok": False, "error": "invalid id"}
+                    continue
+                if task_id in updates:
+                    results[position] = {"ok": False, "error": "duplicate id in batch"}
+                    continue
+                updates[task_id] = (position, op)
+            else:
+                results[position] = {"ok": False, "error": "unknown operation"}
+
+        deltas = Counter()
+        if new_tasks:
+            failed = self._bulk_failures(self.tasks.insert_many, [task for _, task in new_tasks])
+            for index, (position, task) in enumerate(new_tasks):
+                if index in failed:
+                    results[position] = {"ok": False, "error": "write failed"}
+                    continue
+                results[position] = {"ok": True, "id": str(task["_id"])}
+                deltas.update(total=1)
+
+        if updates:
+            deltas.update(self._bulk_update(username, updates, results))
+
+        self._inc_stats(username, **deltas)
+        return results
+
+    def _bulk_update(self, username, updates, results):
+        # Read the current state of the user's tasks in one query: it both
+        # enforces ownership and tells us how each write moves the counters
+        owned = {
+            task["_id"]: task
+            for task in self.tasks.find(
+                {"_id": {"$in": list(updates)}, "username": username},
+                {"completed": 1, "end_date": 1},
+            )
+        }
+
+        # One statement per kind, so the batch is a single bulk_write round trip
+        writes = {"complete": [], "delete": []}   # op -> [(position, task _id, counter deltas)]
+        for task_id, (position, op) in updates.items():
+            task = owned.get(task_id)
+            if task is None:
+                results[position] = {"ok": False, "error": "not found"}
+            elif op == "complete" and task["completed"]:
+                results[position] = {"ok": True, "id": str(task_id)}
+            elif op == "complete":
+                writes["complete"].append((position, task_id, self._complete_deltas(task)))
+            else:
+                writes["delete"].append((position, task_id, self._delete_deltas(task)))
+
+        statements = []
+        if writes["complete"]:
+            statements.append(("complete", UpdateMany(
+                {"_id": {"$in": [task_id for _, task_id, _ in writes["complete"]]},
+                 "username": username, "completed": False},
+                {"$set": {"completed": True}},
+            )))
+        if writes["delete"]:
+            statements.append(("delete", DeleteMany(
+                {"_id": {"$in": [task_id for _, task_id, _ in writes["delete"]]},
+                 "username": username},
+            )))
+
+        deltas = Counter()
+        if not statements:
+            return deltas
+        failed = self._bulk_failures(self.tasks.bulk_write, [statement for _, statement in statements])
+        for index, (op, _) in enumerate(statements):
+            for position, task_id, task_deltas in writes[op]:
+                if index in failed:
+                    results[position] = {"ok": False, "error": "write failed"}
+                    continue
+                results[position] = {"ok": True, "id": str(task_id)}
+                deltas.update(task_deltas)
+        return deltas
+
+    def _bulk_failures(self, write, requests):
+        # Unordered bulk writes carry on past errors; return the failed indexes
+        try:
+            write(requests, ordered=False)
+        except BulkWriteError as e:
+            return {error["index"] for error in e.details["writeErrors"]}
+        return set()
+
+    def _complete_deltas(self, task):
+        return {"completed": 1}
+
+    def _delete_deltas(self, task):
+        return {"total": -1, "completed": -int(task["completed"])}
+
+    def get_stats(self, username):
+        """
+        Returns the user's counters plus the current number of overdue tasks.
+        """
+        return dict(self._get_counters(username), overdue=self.count_overdue(username))
+
+    def count_overdue(self, username):
+        # Deadlines pass without any write, so this is counted at read time;
+        # the (username, completed, end_date) index makes it a range count.
+        # Range operators never match null, so tasks without a deadline are excluded
+        return self.tasks.count_documents(
+            {"username": username, "completed": False, "end_date": {"$lt": datetime.now()}}
+        )
 
-    def delete_task(self, task_id):
-        self.tasks.delete_one({"_id": ObjectId(task_id)})
+    def _get_counters(self, username):
+        # The counter document, built on first use
+        stats = self.stats.find_one({"_id": username})
+        if stats is None:
+            stats = self._rebuild_counters(username)
+        return stats
 
-    def get_completion_percentage(self, tasks):
-        if not tasks:
+    def get_version(self, username):
+        """
+        Returns an opaque string that changes whenever the user's tasks do.
+        Reads only the counter document, never the tasks collection.
+        """
+        stats = self._get_counters(username)
+        return f"{stats['epoch']}-{stats['version']}"
+
+    def get_completion_percentage(self, stats):
+        if not stats["total"]:
             return 0
-        completed = sum(1 for task in tasks if task["completed"])
-        return round((completed / len(tasks)) * 100)
+        return round((stats["completed"] / stats["total"]) * 100)
+
+    def rebuild_stats(self, username=None):
+        """
+        Recounts the counter documents from the tasks collection, for one
+        user or (when username is None) for every user, to repair drift.
+        Returns the user's stats, or the number of users with tasks when
+        rebuilding everyone.
+        """
+        if username is not None:
+            return dict(self._rebuild_counters(username), overdue=self.count_overdue(username))
+        return self._rebuild_counters()
+
+    def _rebuild_counters(self, username=None):
+        match = {} if username is None else {"username": username}
+        counts = {}
+        for row in self.tasks.aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": "$username",
+                "total": {"$sum": 1},
+                "completed": {"$sum": {"$cond": ["$completed", 1, 0]}},
+            }},
+        ]):
+            counts[row["_id"]] = {"total": row["total"], "completed": row["completed"]}
+
+        if username is not None:
+            counts.setdefault(username, {"total": 0, "completed": 0})
+        for user, stats in counts.items():
+            counts[user] = self._write_stats({"_id": user}, stats)
+        if username is not None:
+            return counts[username]
+
+        # Users whose tasks are all gone no longer show up in the aggregation
+        self._write_stats(
+            {"_id": {"$nin": list(counts)}, "total": {"$ne": 0}},
+            {"total": 0, "completed": 0},
+            many=True,
+        )
+        return len(counts)
+
+    def _write_stats(self, query, counts, many=False):
+        # Rebuilt counters still bump the version so cached ETags go stale
+        update = {
+            "$set": counts,
+            "$inc": {"version": 1},
+            "$setOnInsert": {"epoch": str(ObjectId())},
+            # Overdue used to be a stored counter; it is now counted on read
+            "$unset": {"overdue": ""},
+        }
+        if many:
+            return self.stats.update_many(query, update)
+        return self.stats.find_one_and_update(
+            query, update, upsert=True, return_document=ReturnDocument.AFTER
+        )
+
+    def _inc_stats(self, username, **deltas):
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        deltas["version"] = 1
+        result = self.stats.update_one({"_id": username}, {"$inc": deltas})
+        if not result.matched_count:
+            # No counters yet (e.g. tasks created before they existed):
+            # count from scratch, which already includes this write
+            self._rebuild_counters(username)
+
+    def serialize_task(self, task):
+        # JSON-safe view of a task document for the API
+        return {
+            "id": str(task["_id"]),
+            "task": task["task"],
+            "completed": task["completed"],
+            "start_date": task["start_date"].isoformat() if task.get("start_date") else None,
+            "end_date": task["end_date"].isoformat() if task.get("end_date") else None,
+        }
+
+    def import_tasks(self, rows, username=None, chunk_size=1000, progress=None):
+        """
+        Inserts tasks from an iterable of row dicts (as read from an export)
+        in unordered insert_many chunks, consuming the rows lazily.
+
+        With `username` every row is imported for that user, otherwise each
+        row must name its own. Invalid rows are skipped and reported. If
+        reading the rows raises ValueError, the import stops there with
+        "aborted" set; the rows before it are still written.
+        `progress(imported, failed, elapsed_seconds)` is called after each
+        chunk. Returns a summary dict.
+        """
+        started = time.perf_counter()
+        imported = failed = 0
+        errors = []
+        chunk = []
+
+        def flush():
+            nonlocal imported, failed
+            rejected = self._bulk_failures(self.tasks.insert_many, chunk) if chunk else set()
+            written = [task for index, task in enumerate(chunk) if index not in rejected]
+            failed += len(chunk) - len(written)
+            imported += len(written)
+            deltas = {}
+            for task in written:
+                counts = deltas.setdefault(task["username"], Counter())
+                counts.update(total=1, completed=int(task["completed"]))
+            for user, counts in deltas.items():
+                self._inc_stats(user, **counts)
+            chunk.clear()
+            if progress:
+                progress(imported, failed, time.perf_counter() - started)
+
+        aborted = False
+        rows = iter(rows)
+        for line in itertools.count(1):
+            try:
+                row = next(rows)
+            except StopIteration:
+                break
+            except ValueError as e:
+                # The input itself can't be read any further (bad encoding,
+                # broken CSV): keep what was parsed so far and report where
+                aborted = True
+                errors.append({"row": line, "error": f"unreadable input: {e}"})
+                break
+            try:
+                chunk.append(self.task_from_row(row, username))
+            except ValueError as e:
+                failed += 1
+                if len(errors) < MAX_IMPORT_ERRORS:
+                    errors.append({"row": line, "error": str(e)})
+                continue
+            if len(chunk) >= chunk_size:
+                flush()
+        flush()
+
+        elapsed = time.perf_counter() - started
+        return {
+            "imported": imported,
+            "failed": failed,
+            "aborted": aborted,
+            "errors": errors,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round((imported + failed) / elapsed) if elapsed else None,
+        }
+
+    def task_from_row(self, row, username=None):
+        """
+        Builds a task document from an exported row, raising ValueError if
+        the row is invalid. Dates follow format_date.
+        """
+        if not isinstance(row, dict):
+            raise ValueError("malformed row")
+        owner = username or row.get("username")
+        if not owner:
+            raise ValueError("missing username")
+        task_text = row.get("task")
+        if not isinstance(task_text, str) or not task_text.strip():
+            raise ValueError("missing task text")
+
+        task = self.new_task(owner, task_text)
+        bad_date = self._set_dates(task, row)
+        if bad_date:
+            raise ValueError(f"invalid {bad_date}: {row[bad_date]!r}")
+
+        completed = row.get("completed", False)
+        if isinstance(completed, str):
+            completed = completed.strip().lower()
+            if completed not in ("", "true", "false", "1", "0", "yes", "no"):
+                raise ValueError(f"invalid completed: {completed!r}")
+            completed = completed in ("true", "1", "yes")
+        task["completed"] = bool(completed)
+        return task
+
+    def export_row(self, task):
+        # Inverse of task_from_row: dates as strings format_date accepts
+        row = {field: task.get(field) for field in EXPORT_FIELDS}
+        for field in ("start_date", "end_date"):
+            if row[field]:
+                row[field] = row[field].strftime(EXPORT_DATE_FORMAT)
+        return row
+
+    def _set_dates(self, task, source):
+        # Copies start_date/end_date from a request or row into the task;
+        # returns the first field that is set but isn't a date string
+        for field in ("start_date", "end_date"):
+            value = source.get(field)
+            if value is None or value == "":
+                continue
+            task[field] = self.format_date(value) if isinstance(value, str) else None
+            if task[field] is None:
+                return field
+        return None
 
     def format_date(self, date_string):
         """
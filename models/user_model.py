@@ -1,22 +1,62 @@
 from bson import ObjectId
-from werkzeug.security import generate_password_hash, check_password_hash
+from pymongo.errors import DuplicateKeyError
+from security import PasswordHasher
 
 class UserModel:
-    def __init__(self, mongo):
+    def __init__(self, mongo, hasher=None, cache=None):
         self.users = mongo.db.users  # Should reference 'users' collection, not 'tasks'
+        self.hasher = hasher or PasswordHasher()
+        # Optional in-process cache of user documents by username
+        self.cache = cache
+        # Set once the unique username index is known to exist
+        self.unique_usernames = False
+
+    def create_indexes(self):
+        # Lets signup rely on the insert itself to reject taken usernames
+        self.users.create_index("username", unique=True)
+        self.unique_usernames = True
 
     def create_user(self, username, password):
-        hashed_password = generate_password_hash(password)
-        self.users.insert_one({
-            "username": username,
-            "password": hashed_password
-        })
+        """
+        Inserts a new user. Returns False if the username is already taken.
+
+        Without the unique index (e.g. its build failed on existing
+        duplicates) it falls back to looking the username up first, which
+        doesn't stop two concurrent signups for the same name.
+        """
+        if not self.unique_usernames and self.find_by_username(username) is not None:
+            return False
+        hashed_password = self.hasher.hash(password)
+        try:
+            self.users.insert_one({
+                "username": username,
+                "password": hashed_password
+            })
+        except DuplicateKeyError:
+            return False
+        return True
 
     def find_by_username(self, username):
-        return self.users.find_one({"username": username})
+        if self.cache is None:
+            return self.users.find_one({"username": username})
+        user = self.cache.get(username)
+        if user is None:
+            # Only existing users are cached, so a new signup is seen at once
+            user = self.users.find_one({"username": username})
+            if user is not None:
+                self.cache.set(username, user)
+        return user
 
     def verify_user(self, username, password):
         user = self.find_by_username(username)
-        if user and check_password_hash(user["password"], password):
-            return True
-        return False
+        if not user or not self.hasher.verify(user["password"], password):
+            return False
+        # Upgrade hashes made with older cost parameters while we have the password
+        if self.hasher.needs_rehash(user["password"]):
+            self.users.update_one(
+                {"_id": user["_id"]},
+                {"$set": {"password": self.hasher.hash(password)}}
+            )
+            if self.cache is not None:
+                self.cache.pop(username)
+        return True
@@ -0,0 +1,200 @@
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from cache import TTLCache
+
+DEFAULT_HASH_METHOD = "scrypt"
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords with a configurable werkzeug method.
+
+    With workers > 0 the key derivation runs on a bounded process pool, so a
+    burst of logins doesn't hold the GIL and stall every request thread.
+    The pool is started on first use, i.e. after any server fork, from a
+    forkserver (spawn where that's unavailable) rather than by forking a
+    process that already runs request threads. A pool broken by a dead
+    child is replaced and the call retried once, and waiting for a result
+    gives up after `timeout` seconds with concurrent.futures.TimeoutError.
+    """
+
+    def __init__(self, method=None, workers=0, timeout=30):
+        self.method = method or DEFAULT_HASH_METHOD
+        self.workers = workers
+        self.timeout = timeout
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._prefix = None
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        # Hashes look like "<method>$<salt>$<hash>"; the method part carries
+        # the cost parameters, normalized the way werkzeug writes them
+        if self._prefix is None:
+            self._prefix = generate_password_hash("", self.method).split("$", 1)[0]
+        return password_hash.split("$", 1)[0] != self._prefix
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        for attempt in range(2):
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=self._mp_context())
+                pool = self._pool
+            try:
+                return pool.submit(func, *args).result(timeout=self.timeout)
+            except BrokenProcessPool:
+                # A child died (e.g. OOM-killed): the executor can't recover,
+                # so drop it and let the next call start a fresh one
+                with self._pool_lock:
+                    if self._pool is pool:
+                        self._pool = None
+                pool.shutdown(wait=False)
+                if attempt:
+                    raise
+
+    @staticmethod
+    def _mp_context():
+        # Forking a multi-threaded worker can copy locks held by other threads
+        methods = multiprocessing.get_all_start_methods()
+        return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+class MemoryFailureStore:
+    """
+    Local stand-in for MongoFailureStore, for development and tests.
+    Counters live in this process only, in a TTLCache, so under several
+    server workers each one counts separately.
+    """
+
+    def __init__(self, window=300, max_entries=10000):
+        self.window = window
+        self._counts = TTLCache(window, max_entries)  # key -> (count, window start)
+        self._lock = threading.Lock()
+
+    def create_indexes(self):
+        pass
+
+    def count(self, key):
+        return self._counts.get(key, (0, None))[0]
+
+    def increment(self, key):
+        now = time.monotonic()
+        with self._lock:
+            count, started = self._counts.get(key, (0, now))
+            # Keep the expiry at the end of the window the first failure opened
+            self._counts.set(key, (count + 1, started), ttl=started + self.window - now)
+
+    def reset(self, key):
+        self._counts.pop(key)
+
+
+class MongoFailureStore:
+    """
+    Failed-login counters shared by every worker, in a MongoDB collection:
+    {_id: "<key>:<window number>", count, expires_at}. Windows are fixed
+    and aligned to the epoch, so counting is a single atomic upsert, and a
+    TTL index removes finished windows.
+    """
+
+    def __init__(self, collection, window=300):
+        self.failures = collection
+        self.window = window
+
+    def create_indexes(self):
+        self.failures.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+
+    def count(self, key):
+        doc = self.failures.find_one({"_id": self._window_id(key)})
+        return doc["count"] if doc else 0
+
+    def increment(self, key):
+        window = int(time.time() // self.window)
+        expires_at = datetime.fromtimestamp((window + 1) * self.window, timezone.utc).replace(tzinfo=None)
+        self.failures.update_one(
+            {"_id": f"{key}:{window}"},
+            {"$inc": {"count": 1}, "$setOnInsert": {"expires_at": expires_at}},
+            upsert=True,
+        )
+
+    def reset(self, key):
+        self.failures.delete_one({"_id": self._window_id(key)})
+
+    def _window_id(self, key):
+        return f"{key}:{int(time.time() // self.window)}"
+
+
+class LoginThrottle:
+    """
+    Guard in front of password verification.
+
+    Counts failed logins per username and per client IP and blocks keys
+    that exceed their limit within the store's window. Counters live in
+    `failures`: a MongoFailureStore shares them between workers, while the
+    default MemoryFailureStore makes every limit per process.
+
+    It also remembers recently failed (username, password) pairs for a
+    short time so an identical bad attempt is rejected without hashing.
+    That negative cache is always per process; passwords are only kept as
+    keyed digests, in a bounded LRU.
+    """
+
+    def __init__(self, max_failures=5, max_failures_per_ip=50, window=300,
+                 negative_ttl=60, max_entries=10000, failures=None):
+        self.max_failures = max_failures
+        self.max_failures_per_ip = max_failures_per_ip
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.failures = failures or MemoryFailureStore(window, max_entries)
+        self._known_bad = TTLCache(negative_ttl, max_entries)
+        self._digest_key = os.urandom(32)
+
+    def is_blocked(self, username, ip):
+        return (
+            self.failures.count(f"user:{username}") >= self.max_failures
+            or self.failures.count(f"ip:{ip}") >= self.max_failures_per_ip
+        )
+
+    def is_known_bad(self, username, password):
+        return self._known_bad.get(self._attempt_key(username, password)) is not None
+
+    def record_failure(self, username, ip, password, remember_attempt=True):
+        """
+        Counts a failed login. With remember_attempt the (username, password)
+        pair also goes into the negative cache; callers pass False for
+        usernames that don't exist, so signing up with that name later
+        isn't rejected by an earlier miss.
+        """
+        self.failures.increment(f"user:{username}")
+        self.failures.increment(f"ip:{ip}")
+        if remember_attempt:
+            self._known_bad.set(self._attempt_key(username, password), True)
+
+    def record_success(self, username, ip):
+        self.failures.reset(f"user:{username}")
+
+    def _attempt_key(self, username, password):
+        message = f"{username}\0{password}".encode()
+        return hmac.new(self._digest_key, message, hashlib.sha256).digest()
@@ -0,0 +1,182 @@
+import secrets
+import threading
+from datetime import datetime, timedelta, timezone
+
+from flask.sessions import SessionInterface, SessionMixin
+from pymongo import ASCENDING
+from werkzeug.datastructures import CallbackDict
+
+
+def utcnow():
+    # MongoDB hands datetimes back naive, in UTC, so compare with the same
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class MongoSessionStore:
+    """
+    Sessions in a MongoDB collection: {_id: sid, data, username, expires_at}.
+    A TTL index lets the server purge expired sessions on its own.
+    """
+
+    def __init__(self, collection):
+        self.sessions = collection
+
+    def create_indexes(self):
+        self.sessions.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+        self.sessions.create_index([("username", ASCENDING)])
+
+    def load(self, sid):
+        # The TTL monitor only runs once a minute, so check expiry here too
+        doc = self.sessions.find_one({"_id": sid, "expires_at": {"$gt": utcnow()}})
+        if doc is None:
+            return None
+        return doc["data"], doc.get("username"), doc["expires_at"]
+
+    def save(self, sid, data, username, expires_at):
+        self.sessions.replace_one(
+            {"_id": sid},
+            {"data": data, "username": username, "expires_at": expires_at},
+            upsert=True,
+        )
+
+    def delete(self, sid):
+        self.sessions.delete_one({"_id": sid})
+
+    def delete_for_user(self, username):
+        return self.sessions.delete_many({"username": username}).deleted_count
+
+
+class MemorySessionStore:
+    """
+    Local stand-in for MongoSessionStore, for development and tests.
+    Sessions live in this process only.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create_indexes(self):
+        pass
+
+    def load(self, sid):
+        with self._lock:
+            record = self._sessions.get(sid)
+            if record is None:
+                return None
+            if record[2] <= utcnow():
+                del self._sessions[sid]
+                return None
+            return record
+
+    def save(self, sid, data, username, expires_at):
+        with self._lock:
+            self._sessions[sid] = (data, username, expires_at)
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def delete_for_user(self, username):
+        with self._lock:
+            sids = [sid for sid, record in self._sessions.items() if record[1] == username]
+            for sid in sids:
+                del self._sessions[sid]
+        return len(sids)
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, expires_at=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.new = new
+        self.modified = False
+        self.loaded_user = self.get("user")
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Keeps session data in a store and only a random session id in the
+    cookie, so sessions can be listed and revoked server side.
+
+    Loaded sessions are kept in an in-process TTL/LRU cache, so most
+    requests don't touch the store. Each worker has its own cache: a change
+    made through another worker (including revocation) is seen once the
+    cached entry expires.
+    """
+
+    def __init__(self, store, lifetime, cache):
+        self.store = store
+        self.lifetime = lifetime
+        self.cache = cache
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            record = self.cache.get(sid)
+            if record is None:
+                record = self.store.load(sid)
+                if record is not None:
+                    self.cache.set(sid, record)
+            if record is not None and record[2] > utcnow():
+                return ServerSession(dict(record[0]), sid=sid, expires_at=record[2])
+        return ServerSession(sid=self._new_sid(), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if not session.new:
+                self._forget(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = utcnow()
+        # Unchanged sessions are only rewritten once half their lifetime has
+        # passed, to slide the expiry without a write per request
+        stale = session.expires_at is None or session.expires_at - now < timedelta(seconds=self.lifetime / 2)
+        if not (session.modified or stale):
+            return
+
+        username = session.get("user")
+        if username != session.loaded_user and not session.new:
+            # Logging in or out gets a fresh id so an id issued before
+            # login can't be reused afterwards
+            self._forget(session.sid)
+            session.sid = self._new_sid()
+
+        expires_at = now + timedelta(seconds=self.lifetime)
+        data = dict(session)
+        self.store.save(session.sid, data, username, expires_at)
+        self.cache.set(session.sid, (data, username, expires_at))
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=expires_at.replace(tzinfo=timezone.utc),
+            httponly=self.get_cookie_httponly(app),
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+            domain=domain,
+            path=path,
+        )
+
+    def revoke_user(self, username):
+        """
+        Ends every session of `username`. Returns how many were removed.
+        """
+        count = self.store.delete_for_user(username)
+        self.cache.discard_where(lambda record: record[1] == username)
+        return count
+
+    def _forget(self, sid):
+        self.store.delete(sid)
+        self.cache.pop(sid)
+
+    def _new_sid(self):
+        return secrets.token_urlsafe(32)
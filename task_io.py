@@ -0,0 +1,75 @@
+import csv
+import io
+import json
+
+from models.task_model import EXPORT_FIELDS
+
+# Supported export/import formats and their content types
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def export_chunks(task_model, tasks, fmt, rows_per_chunk=500):
+    """
+    Encodes an iterable of task documents as CSV or NDJSON, yielding text a
+    few hundred rows at a time so the whole export never sits in memory.
+    """
+    buffer = io.StringIO()
+    writer = None
+    if fmt == "csv":
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+
+    for count, task in enumerate(tasks, start=1):
+        row = task_model.export_row(task)
+        if writer:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row) + "\n")
+        if count % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def decode_lines(stream, encoding="utf-8"):
+    """
+    Decodes a binary stream line by line. Unlike io.TextIOWrapper it only
+    needs the stream to be iterable, which upload streams such as
+    SpooledTemporaryFile on Python 3.10 are, without being full io objects.
+    Line endings are kept, so CSV fields with embedded newlines survive.
+    """
+    for line in stream:
+        yield line.decode(encoding)
+
+
+def read_rows(stream, fmt):
+    """
+    Lazily parses text lines of CSV or NDJSON into row dicts. Lines
+    that aren't valid JSON come through as None, for the importer to reject.
+    CSV that can't be parsed any further raises ValueError.
+    """
+    if fmt == "csv":
+        try:
+            yield from csv.DictReader(stream)
+        except csv.Error as e:
+            raise ValueError(f"malformed CSV: {e}") from e
+        return
+
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def format_from_filename(filename, default="csv"):
+    extension = filename.rsplit(".", 1)[-1].lower() if filename and "." in filename else ""
+    return extension if extension in FORMATS else default
@@ -1,10 +1,21 @@
 import pytest
 import sys
 import os
+import io
+import time
+from types import SimpleNamespace
+
+import mongomock
+from pymongo import MongoClient
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import app as todo_app
 from app import app
+from cache import TTLCache
+from models.task_model import TaskModel
+from models.user_model import UserModel
+from security import LoginThrottle, PasswordHasher
 
 
 @pytest.fixture
@@ -13,6 +24,28 @@ def client():
     with app.test_client() as client:
         yield client
 
+@pytest.fixture
+def db(monkeypatch):
+    # Route tests against mongomock: swap in models backed by an in-memory database
+    database = mongomock.MongoClient().todo_db
+    mongo = SimpleNamespace(db=database)
+    user_model = UserModel(mongo, PasswordHasher("pbkdf2:sha256:1000"), TTLCache())
+    user_model.create_indexes()
+    task_model = TaskModel(mongo)
+    task_model.create_indexes()
+    monkeypatch.setattr(todo_app, "user_model", user_model)
+    monkeypatch.setattr(todo_app, "task_model", task_model)
+    monkeypatch.setattr(todo_app, "login_throttle", LoginThrottle())
+    return database
+
+def signup(client, username, password="secret"):
+    return client.post("/signup", data={
+        "username": username, "password": password, "confirm_password": password,
+    })
+
+def login(client, username, password="secret"):
+    return client.post("/login", data={"username": username, "password": password})
+
 def test_home_redirect(client):
     response = client.get("/")
     assert response.status_code == 302
@@ -22,3 +55,109 @@ def test_login_page(client):
     response = client.get("/login")
     assert response.status_code == 200
     assert b"Sign In" in response.data
+
+def test_api_requires_login(client):
+    assert client.get("/api/tasks").status_code == 401
+    assert client.post("/api/tasks/batch", json={"operations": []}).status_code == 401
+
+def test_healthz_reports_unavailable_database(client):
+    response = client.get("/healthz")
+    assert response.status_code == 503
+    assert response.json["status"] in ("starting", "unavailable")
+
+def test_healthz_times_out_quickly(client, monkeypatch):
+    unreachable = MongoClient("mongodb://127.0.0.1:1", connect=False)
+    monkeypatch.setattr(todo_app.mongo, "cx", unreachable)
+    monkeypatch.setitem(app.config, "HEALTHZ_TIMEOUT", 0.2)
+    try:
+        started = time.monotonic()
+        response = client.get("/healthz")
+        assert response.status_code == 503
+        assert time.monotonic() - started < 5
+    finally:
+        unreachable.close()
+
+def test_failed_login_before_signup_does_not_lock_out(db, client):
+    assert b"Invalid username or password" in login(client, "newcomer").data
+    signup(client, "newcomer")
+
+    response = login(client, "newcomer")
+    assert response.status_code == 302
+    assert response.headers["Location"].endswith("/dashboard")
+
+def test_repeated_bad_password_is_rejected(db, client):
+    signup(client, "alice")
+    assert b"Invalid username or password" in login(client, "alice", "wrong").data
+    assert todo_app.login_throttle.is_known_bad("alice", "wrong")
+
+def test_api_tasks_etag(db, client):
+    signup(client, "alice")
+    login(client, "alice")
+    client.post("/add", data={"task": "one"})
+
+    first = client.get("/api/tasks")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert [task["task"] for task in first.json["tasks"]] == ["one"]
+
+    cached = client.get("/api/tasks", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+    weak = client.get("/api/tasks", headers={"If-None-Match": f"W/{etag}"})
+    assert weak.status_code == 304
+
+    client.post("/add", data={"task": "two"})
+    changed = client.get("/api/tasks", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert len(changed.json["tasks"]) == 2
+
+def test_batch_route(db, client, monkeypatch):
+    signup(client, "alice")
+    login(client, "alice")
+
+    response = client.post("/api/tasks/batch", json={"operations": [
+        {"op": "add", "task": "ok", "end_date": "2999-01-01T10:00"},
+        {"op": "add", "task": "a", "end_date": 12345},
+    ]})
+    assert response.status_code == 200
+    assert response.json["results"][0]["ok"]
+    assert response.json["results"][1] == {"ok": False, "error": "invalid end_date"}
+    assert db.tasks.count_documents({"username": "alice"}) == 1
+
+    assert client.post("/api/tasks/batch", json={"operations": "add"}).status_code == 400
+    monkeypatch.setitem(app.config, "BATCH_MAX_OPERATIONS", 1)
+    too_many = {"operations": [{"op": "add", "task": "x"}] * 2}
+    assert client.post("/api/tasks/batch", json=too_many).status_code == 413
+
+def test_import_upload_and_raw_body(db, client):
+    signup(client, "alice")
+    login(client, "alice")
+
+    upload = "username,task,completed,start_date,end_date\r\nmallory,\"two\nlines\",true,,2999-01-01T10:00\r\n"
+    response = client.post("/import/tasks", data={"file": (io.BytesIO(upload.encode()), "tasks.csv")})
+    assert response.status_code == 200
+    assert (response.json["imported"], response.json["failed"]) == (1, 0)
+
+    body = '{"task": "café"}\n{"task": "y", "end_date": 5}\n'
+    response = client.post("/import/tasks", data=body.encode(), content_type="application/x-ndjson")
+    assert (response.json["imported"], response.json["failed"]) == (1, 1)
+
+    tasks = db.tasks.find({"username": "alice"}, sort=[("task", 1)])
+    assert [task["task"] for task in tasks] == ["café", "two\nlines"]
+    assert db.tasks.count_documents({"username": "mallory"}) == 0
+
+@pytest.mark.parametrize("body", [
+    b'{"task": "kept"}\n{"task": "\xff"}\n',
+    b'task\nkept\n"' + b"x" * 200000 + b'"\n',
+])
+def test_import_stops_on_unreadable_input(db, client, body):
+    signup(client, "alice")
+    login(client, "alice")
+
+    content_type = "application/x-ndjson" if body.startswith(b"{") else "text/csv"
+    response = client.post("/import/tasks", data=body, content_type=content_type)
+    assert response.status_code == 400
+    assert (response.json["imported"], response.json["aborted"]) == (1, True)
+    assert response.json["errors"][0]["error"].startswith("unreadable input")
+    assert db.tasks.count_documents({"username": "alice"}) == 1
@@ -0,0 +1,29 @@
+import json
+import os
+import subprocess
+import sys
+
+BENCH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'bench_app.py'))
+
+
+def run_bench(*args):
+    # Separate process: the harness swaps in mongomock before importing the app
+    return subprocess.run(
+        [sys.executable, BENCH, "--task-counts", "5", "--iterations", "3", "--concurrency", "2", *args],
+        capture_output=True, text=True, timeout=120,
+    )
+
+def test_benchmark_smoke(tmp_path):
+    output = tmp_path / "bench.json"
+    result = run_bench("--output", str(output))
+    assert result.returncode == 0, result.stderr
+
+    report = json.loads(output.read_text())
+    assert report["meta"]["backend"] == "mongomock"
+    scenarios = {(row["driver"], row["scenario"]) for row in report["results"]}
+    assert ("http", "dashboard") in scenarios
+    assert ("test_client", "signup") in scenarios
+    assert ("model", "get_tasks") in scenarios
+    assert all(row["errors"] == 0 for row in report["results"])
+
+    assert run_bench("--drivers", "test_client", "--compare", str(output), "--max-regression", "1000").returncode == 0
@@ -0,0 +1,63 @@
+import pytest
+import sys
+import os
+
+from flask import Flask
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from metrics import Histogram, Metrics
+
+
+def make_app(metrics):
+    app = Flask(__name__)
+    metrics.init_app(app)
+
+    @app.route("/tasks/<task_id>")
+    def task(task_id):
+        # Stand-in for the queries a real route would issue
+        metrics.record_command("find", 2500, {"cursor": {"firstBatch": [{}, {}, {}]}})
+        metrics.record_command("findAndModify", 250000, {"value": {}})
+        return "ok"
+
+    return app
+
+def test_histogram_render_is_cumulative():
+    histogram = Histogram("latency", "Latency.", ("route",), (0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(("/a",), value)
+
+    lines = histogram.render()
+    assert 'latency_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'latency_bucket{route="/a",le="1"} 2' in lines
+    assert 'latency_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'latency_count{route="/a"} 3' in lines
+    assert 'latency_sum{route="/a"} 5.55' in lines
+
+def test_request_and_command_metrics():
+    metrics = Metrics(slow_query_ms=100, server_timing=True)
+    client = make_app(metrics).test_client()
+
+    response = client.get("/tasks/123")
+    assert response.headers["Server-Timing"].endswith('desc="2 commands"')
+
+    text = metrics.render()
+    assert 'todo_http_requests_total{route="/tasks/<task_id>",method="GET",status="200"} 1' in text
+    assert 'todo_mongo_command_duration_seconds_count{command="find"} 1' in text
+    assert 'todo_mongo_slow_commands_total{command="findAndModify"} 1' in text
+    assert 'todo_mongo_slow_commands_total{command="find"}' not in text
+    assert 'todo_mongo_documents_returned_per_request_bucket{route="/tasks/<task_id>",le="1"} 0' in text
+    assert 'todo_mongo_documents_returned_per_request_bucket{route="/tasks/<task_id>",le="10"} 1' in text
+
+def test_unsampled_requests_are_not_recorded():
+    metrics = Metrics(sample_rate=0, server_timing=True)
+    client = make_app(metrics).test_client()
+
+    response = client.get("/tasks/123")
+    assert "Server-Timing" not in response.headers
+    assert "todo_http_requests_total{" not in metrics.render()
+
+def test_commands_outside_requests_are_ignored():
+    metrics = Metrics()
+    metrics.record_command("createIndexes", 1000, {"ok": 1})
+    assert "createIndexes" not in metrics.render()
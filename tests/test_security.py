@@ -0,0 +1,115 @@
+import pytest
+import sys
+import os
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from types import SimpleNamespace
+
+import mongomock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models.user_model import UserModel
+from security import PasswordHasher, LoginThrottle, MongoFailureStore
+
+FAST_METHOD = "pbkdf2:sha256:1000"
+
+
+@pytest.fixture
+def users():
+    return mongomock.MongoClient().todo_db.users
+
+def test_hasher_round_trip_in_process_pool():
+    hasher = PasswordHasher(FAST_METHOD, workers=1)
+    try:
+        password_hash = hasher.hash("secret")
+        assert hasher.verify(password_hash, "secret")
+        assert not hasher.verify(password_hash, "wrong")
+        assert hasher._pool._mp_context.get_start_method() != "fork"
+    finally:
+        hasher.shutdown()
+
+def test_hasher_replaces_broken_pool():
+    hasher = PasswordHasher(FAST_METHOD, workers=1)
+    try:
+        with pytest.raises(BrokenProcessPool):
+            hasher._run(os._exit, 1)
+        assert hasher.verify(hasher.hash("secret"), "secret")
+    finally:
+        hasher.shutdown()
+
+def test_hasher_result_timeout():
+    hasher = PasswordHasher(FAST_METHOD, workers=1, timeout=0.1)
+    try:
+        with pytest.raises(FutureTimeout):
+            hasher._run(time.sleep, 1)
+    finally:
+        hasher.shutdown()
+
+def test_needs_rehash_on_cost_change():
+    old = PasswordHasher(FAST_METHOD).hash("secret")
+    assert not PasswordHasher(FAST_METHOD).needs_rehash(old)
+    assert PasswordHasher("pbkdf2:sha256:2000").needs_rehash(old)
+
+def test_verify_user_rehashes_with_current_cost(users):
+    mongo = SimpleNamespace(db=users.database)
+    UserModel(mongo, PasswordHasher(FAST_METHOD)).create_user("alice", "secret")
+
+    upgraded = UserModel(mongo, PasswordHasher("pbkdf2:sha256:2000"))
+    assert not upgraded.verify_user("alice", "wrong")
+    assert users.find_one({"username": "alice"})["password"].startswith("pbkdf2:sha256:1000$")
+
+    assert upgraded.verify_user("alice", "secret")
+    assert users.find_one({"username": "alice"})["password"].startswith("pbkdf2:sha256:2000$")
+
+def test_throttle_blocks_after_max_failures():
+    throttle = LoginThrottle(max_failures=3, max_failures_per_ip=10)
+    for i in range(3):
+        assert not throttle.is_blocked("alice", "1.2.3.4")
+        throttle.record_failure("alice", "1.2.3.4", f"guess{i}")
+    assert throttle.is_blocked("alice", "5.6.7.8")
+    assert not throttle.is_blocked("bob", "5.6.7.8")
+
+def test_throttle_blocks_ip_across_usernames():
+    throttle = LoginThrottle(max_failures=3, max_failures_per_ip=4)
+    for i in range(4):
+        throttle.record_failure(f"user{i}", "1.2.3.4", "guess")
+    assert throttle.is_blocked("someone", "1.2.3.4")
+
+def test_throttle_window_expires():
+    throttle = LoginThrottle(max_failures=1, window=0)
+    throttle.record_failure("alice", "1.2.3.4", "guess")
+    assert not throttle.is_blocked("alice", "1.2.3.4")
+
+def test_throttle_shared_between_workers():
+    store = MongoFailureStore(mongomock.MongoClient().todo_db.login_failures)
+    store.create_indexes()
+    workers = [LoginThrottle(max_failures=4, failures=store) for _ in range(2)]
+    for i in range(4):
+        workers[i % 2].record_failure("alice", "1.2.3.4", f"guess{i}")
+    assert all(worker.is_blocked("alice", "1.2.3.4") for worker in workers)
+
+    workers[0].record_success("alice", "1.2.3.4")
+    assert not workers[1].is_blocked("alice", "1.2.3.4")
+
+def test_negative_cache():
+    throttle = LoginThrottle(negative_ttl=60)
+    throttle.record_failure("alice", "1.2.3.4", "guess")
+    assert throttle.is_known_bad("alice", "guess")
+    assert not throttle.is_known_bad("alice", "other")
+    assert not throttle.is_known_bad("bob", "guess")
+
+    expired = LoginThrottle(negative_ttl=0)
+    expired.record_failure("alice", "1.2.3.4", "guess")
+    assert not expired.is_known_bad("alice", "guess")
+
+def test_throttle_tables_are_bounded():
+    throttle = LoginThrottle(max_entries=10)
+    for i in range(100):
+        throttle.record_failure(f"user{i}", f"10.0.0.{i}", "guess")
+    # The oldest keys were evicted, the most recent are still tracked
+    assert throttle.failures.count("user:user0") == 0
+    assert not throttle.is_known_bad("user0", "guess")
+    assert throttle.failures.count("user:user99") == 1
+    assert throttle.is_known_bad("user99", "guess")
@@ -0,0 +1,142 @@
+import pytest
+import sys
+import os
+from types import SimpleNamespace
+
+import mongomock
+from flask import Flask, session
+from pymongo.errors import PyMongoError
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cache import TTLCache
+from models.user_model import UserModel
+from security import PasswordHasher
+from sessions import MemorySessionStore, MongoSessionStore, ServerSideSessionInterface
+
+
+def make_app(store, cache_ttl=30):
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.session_interface = ServerSideSessionInterface(store, 3600, TTLCache(cache_ttl))
+
+    @app.route("/login/<username>")
+    def login(username):
+        session["user"] = username
+        return "ok"
+
+    @app.route("/whoami")
+    def whoami():
+        return session.get("user", "")
+
+    @app.route("/logout")
+    def logout():
+        session.clear()
+        return "ok"
+
+    return app
+
+@pytest.fixture(params=["memory", "mongo"])
+def store(request):
+    if request.param == "memory":
+        return MemorySessionStore()
+    store = MongoSessionStore(mongomock.MongoClient().todo_db.sessions)
+    store.create_indexes()
+    return store
+
+def session_cookie(client):
+    return client.get_cookie("session")
+
+def test_session_round_trip(store):
+    client = make_app(store).test_client()
+    assert client.get("/whoami").data == b""
+    assert session_cookie(client) is None
+
+    client.get("/login/alice")
+    assert client.get("/whoami").data == b"alice"
+    assert len(session_cookie(client).value) > 30
+
+def test_login_rotates_session_id(store):
+    app = make_app(store)
+    client = app.test_client()
+    client.get("/login/alice")
+    first = session_cookie(client).value
+
+    client.get("/login/bob")
+    second = session_cookie(client).value
+    assert first != second
+    assert store.load(first) is None
+    assert client.get("/whoami").data == b"bob"
+
+def test_logout_deletes_session(store):
+    client = make_app(store).test_client()
+    client.get("/login/alice")
+    sid = session_cookie(client).value
+
+    client.get("/logout")
+    assert store.load(sid) is None
+    assert client.get("/whoami").data == b""
+
+def test_revoke_user(store):
+    app = make_app(store)
+    alice, other_alice, bob = (app.test_client() for _ in range(3))
+    alice.get("/login/alice")
+    other_alice.get("/login/alice")
+    bob.get("/login/bob")
+
+    assert app.session_interface.revoke_user("alice") == 2
+    assert alice.get("/whoami").data == b""
+    assert other_alice.get("/whoami").data == b""
+    assert bob.get("/whoami").data == b"bob"
+
+def test_cached_session_skips_store():
+    store = MemorySessionStore()
+    client = make_app(store).test_client()
+    client.get("/login/alice")
+
+    # Removing the record behind the cache's back: the cached copy still serves
+    store.delete(session_cookie(client).value)
+    assert client.get("/whoami").data == b"alice"
+
+def test_ttl_cache_expiry_and_eviction():
+    cache = TTLCache(ttl=60, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+    cache.set("d", 4, ttl=0)
+    assert cache.get("d") is None
+
+def test_signup_relies_on_unique_index():
+    mongo = SimpleNamespace(db=mongomock.MongoClient().todo_db)
+    users = UserModel(mongo, PasswordHasher("pbkdf2:sha256:1000"), TTLCache())
+    users.create_indexes()
+
+    assert users.create_user("alice", "secret")
+    assert not users.create_user("alice", "other")
+    assert users.users.count_documents({"username": "alice"}) == 1
+
+def test_signup_checks_username_without_unique_index():
+    mongo = SimpleNamespace(db=mongomock.MongoClient().todo_db)
+    mongo.db.users.insert_many([{"username": "alice"}, {"username": "alice"}])
+    users = UserModel(mongo, PasswordHasher("pbkdf2:sha256:1000"), TTLCache())
+    with pytest.raises(PyMongoError):
+        users.create_indexes()
+
+    assert not users.create_user("alice", "secret")
+    assert users.create_user("bob", "secret")
+    assert users.users.count_documents({"username": "alice"}) == 2
+
+def test_user_cache():
+    mongo = SimpleNamespace(db=mongomock.MongoClient().todo_db)
+    users = UserModel(mongo, PasswordHasher("pbkdf2:sha256:1000"), TTLCache())
+    assert users.find_by_username("alice") is None
+
+    users.create_user("alice", "secret")
+    assert users.find_by_username("alice")["username"] == "alice"
+
+    users.users.delete_many({})
+    assert users.find_by_username("alice") is not None
@@ -0,0 +1,55 @@
+import pytest
+import sys
+import os
+import io
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import task_io
+
+
+class StubModel:
+    def export_row(self, task):
+        return task
+
+ROWS = [
+    {"username": "alice", "task": "one, with comma", "completed": False, "start_date": None, "end_date": "2024-01-02T00:00"},
+    {"username": "alice", "task": "two\nlines", "completed": True, "start_date": "2024-01-01T09:00", "end_date": None},
+]
+
+@pytest.mark.parametrize("rows_per_chunk", [1, 500])
+def test_csv_round_trip(rows_per_chunk):
+    chunks = list(task_io.export_chunks(StubModel(), iter(ROWS), "csv", rows_per_chunk))
+    assert len(chunks) == (2 if rows_per_chunk == 1 else 1)
+
+    rows = list(task_io.read_rows(io.StringIO("".join(chunks), newline=""), "csv"))
+    assert [row["task"] for row in rows] == ["one, with comma", "two\nlines"]
+    assert rows[1]["completed"] == "True"
+
+def test_ndjson_round_trip():
+    text = "".join(task_io.export_chunks(StubModel(), iter(ROWS), "ndjson"))
+    assert [json.loads(line) for line in text.splitlines()] == ROWS
+    assert list(task_io.read_rows(io.StringIO(text + "\n{oops\n"), "ndjson")) == ROWS + [None]
+
+def test_read_rows_from_bare_binary_stream():
+    class Upload:
+        # Iterable but not an io object, like SpooledTemporaryFile on 3.10
+        def __init__(self, data):
+            self.data = data
+
+        def __iter__(self):
+            return iter(io.BytesIO(self.data))
+
+    text = "".join(task_io.export_chunks(StubModel(), iter(ROWS), "csv")) + "alice,café,,,\r\n"
+    rows = list(task_io.read_rows(task_io.decode_lines(Upload(text.encode())), "csv"))
+    assert [row["task"] for row in rows] == ["one, with comma", "two\nlines", "café"]
+
+def test_empty_export():
+    assert "".join(task_io.export_chunks(StubModel(), iter([]), "csv")).strip() == "username,task,completed,start_date,end_date"
+    assert list(task_io.export_chunks(StubModel(), iter([]), "ndjson")) == []
+
+def test_format_from_filename():
+    assert task_io.format_from_filename("tasks.NDJSON") == "ndjson"
+    assert task_io.format_from_filename("tasks.txt") == "csv"
+    assert task_io.format_from_filename(None) == "csv"
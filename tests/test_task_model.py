@@ -0,0 +1,252 @@
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import mongomock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models.task_model import TaskModel
+
+
+@pytest.fixture
+def task_model():
+    mongo = SimpleNamespace(db=mongomock.MongoClient().todo_db)
+    model = TaskModel(mongo)
+    model.create_indexes()
+    return model
+
+def add_tasks(task_model, username, count):
+    for i in range(count):
+        task_model.add_task(username, f"task {i}", end_date=f"2024-01-{i % 28 + 1:02d}T10:00")
+
+def counts(stats):
+    return stats["total"], stats["completed"], stats["overdue"]
+
+def test_create_indexes(task_model):
+    keys = [index["key"] for index in task_model.tasks.index_information().values()]
+    assert [("username", 1), ("completed", 1), ("end_date", 1), ("_id", 1)] in keys
+
+def test_pages_cover_all_tasks_once(task_model):
+    add_tasks(task_model, "alice", 45)
+    task_model.add_task("alice", "no deadline")
+    add_tasks(task_model, "bob", 5)
+
+    seen = []
+    cursor = None
+    while True:
+        tasks, cursor, _ = task_model.get_tasks_page("alice", 10, after=cursor)
+        seen.extend(tasks)
+        if not cursor:
+            break
+
+    assert len(seen) == 46
+    assert len({task["_id"] for task in seen}) == 46
+    assert seen[0]["task"] == "no deadline"
+    assert set(seen[0]) <= {"_id", "task", "completed", "start_date", "end_date"}
+
+def test_previous_page(task_model):
+    add_tasks(task_model, "alice", 25)
+    first, next_cursor, prev_cursor = task_model.get_tasks_page("alice", 10)
+    assert prev_cursor is None
+
+    second, _, prev_cursor = task_model.get_tasks_page("alice", 10, after=next_cursor)
+    back, _, _ = task_model.get_tasks_page("alice", 10, before=prev_cursor)
+    assert [t["_id"] for t in back] == [t["_id"] for t in first]
+    assert not {t["_id"] for t in first} & {t["_id"] for t in second}
+
+def test_pages_with_sub_second_dates(task_model):
+    due = datetime(2024, 1, 1, 10, 0, 0, 250000)
+    for i in range(4):
+        task = task_model.new_task("alice", f"t{i}")
+        task["end_date"] = due + timedelta(seconds=i)
+        task_model.tasks.insert_one(task)
+
+    seen = []
+    cursor = None
+    while True:
+        tasks, cursor, _ = task_model.get_tasks_page("alice", 2, after=cursor)
+        seen.extend(task["task"] for task in tasks)
+        if not cursor:
+            break
+    assert seen == ["t0", "t1", "t2", "t3"]
+
+    _, _, prev_cursor = task_model.get_tasks_page("alice", 2, after=task_model.encode_cursor(tasks[0]))
+    back, _, _ = task_model.get_tasks_page("alice", 2, before=prev_cursor)
+    assert [task["task"] for task in back] == ["t1", "t2"]
+
+def test_malformed_cursor_returns_first_page(task_model):
+    add_tasks(task_model, "alice", 3)
+    tasks, _, _ = task_model.get_tasks_page("alice", 10, after="garbage")
+    assert len(tasks) == 3
+
+def test_completion_percentage_counts_all_tasks(task_model):
+    add_tasks(task_model, "alice", 4)
+    task_id = task_model.get_tasks("alice")[0]["_id"]
+    task_model.complete_task(str(task_id), "alice")
+    assert task_model.get_completion_percentage(task_model.get_stats("alice")) == 25
+    assert task_model.get_completion_percentage(task_model.get_stats("nobody")) == 0
+
+def test_stats_follow_writes(task_model):
+    task_model.add_task("alice", "past", end_date="2000-01-01T10:00")
+    task_model.add_task("alice", "future", end_date="2999-01-01T10:00")
+    task_model.add_task("alice", "someday")
+    past, future, _ = task_model.get_tasks("alice")
+
+    task_model.complete_task(str(future["_id"]), "alice")
+    task_model.complete_task(str(future["_id"]), "alice")
+    task_model.delete_task(str(past["_id"]), "alice")
+
+    stats = task_model.get_stats("alice")
+    assert counts(stats) == (2, 1, 0)
+    assert counts(task_model.rebuild_stats("alice")) == (2, 1, 0)
+
+def test_overdue_follows_passing_deadlines(task_model):
+    task_model.add_task("alice", "first", end_date="2999-01-01T10:00")
+    task_model.add_task("alice", "second", end_date="2999-01-01T10:00")
+    task_model.add_task("alice", "third", end_date="2999-01-01T10:00")
+    assert task_model.get_stats("alice")["overdue"] == 0
+
+    # The deadlines pass without any write going through the model
+    task_model.tasks.update_many({}, {"$set": {"end_date": datetime(2000, 1, 1)}})
+    assert task_model.get_stats("alice")["overdue"] == 3
+
+    first, second, _ = task_model.get_tasks("alice")
+    task_model.complete_task(first["_id"], "alice")
+    task_model.delete_task(second["_id"], "alice")
+    assert counts(task_model.get_stats("alice")) == (2, 1, 1)
+
+def test_rebuild_stats_repairs_drift(task_model):
+    add_tasks(task_model, "alice", 3)
+    add_tasks(task_model, "bob", 2)
+    task_model.stats.update_one({"_id": "alice"}, {"$set": {"total": 99}})
+    task_model.tasks.insert_one({"username": "carol", "task": "imported", "completed": True, "end_date": None})
+
+    assert task_model.rebuild_stats() == 3
+    assert task_model.get_stats("alice")["total"] == 3
+    assert task_model.get_stats("alice")["overdue"] == 3
+    assert task_model.get_stats("carol")["completed"] == 1
+
+    task_model.tasks.delete_many({"username": "bob"})
+    task_model.rebuild_stats()
+    assert counts(task_model.get_stats("bob")) == (0, 0, 0)
+
+def test_version_changes_on_every_write(task_model):
+    task_model.add_task("alice", "one")
+    versions = [task_model.get_version("alice")]
+    task_id = task_model.get_tasks("alice")[0]["_id"]
+
+    task_model.complete_task(task_id, "alice")
+    versions.append(task_model.get_version("alice"))
+    task_model.complete_task(task_id, "alice")
+    versions.append(task_model.get_version("alice"))
+    task_model.bulk_tasks("alice", [{"op": "add", "task": "two"}])
+    versions.append(task_model.get_version("alice"))
+    task_model.rebuild_stats("alice")
+    versions.append(task_model.get_version("alice"))
+
+    assert versions[1] == versions[2]
+    assert len(set(versions)) == 4
+    assert task_model.get_version("alice") != task_model.get_version("bob")
+
+def test_serialize_task(task_model):
+    task_model.add_task("alice", "one", "2024-01-01T09:00", "2024-01-02")
+    task = task_model.serialize_task(task_model.get_tasks("alice")[0])
+    assert task["start_date"] == "2024-01-01T09:00:00"
+    assert task["end_date"] == "2024-01-02T00:00:00"
+    assert isinstance(task["id"], str)
+
+def test_complete_and_delete_require_owner(task_model):
+    task_model.add_task("alice", "mine")
+    task_id = task_model.get_tasks("alice")[0]["_id"]
+
+    task_model.complete_task(task_id, "mallory")
+    task_model.delete_task(task_id, "mallory")
+    assert task_model.get_tasks("alice")[0]["completed"] is False
+
+def test_bulk_tasks_mixed_operations(task_model):
+    add_tasks(task_model, "alice", 3)
+    add_tasks(task_model, "bob", 1)
+    first, second, third = (str(t["_id"]) for t in task_model.get_tasks("alice"))
+    bobs = str(task_model.get_tasks("bob")[0]["_id"])
+
+    results = task_model.bulk_tasks("alice", [
+        {"op": "add", "task": "new", "end_date": "2999-01-01T10:00"},
+        {"op": "complete", "id": first},
+        {"op": "delete", "id": second},
+        {"op": "delete", "id": bobs},
+        {"op": "complete", "id": "not-an-id"},
+        {"op": "delete", "id": first},
+        {"op": "add", "task": ""},
+        {"op": "rename"},
+        {"op": "add", "task": "a", "end_date": 12345},
+        {"op": "add", "task": "b", "start_date": ["2024-01-01"]},
+        {"op": "add", "task": "c", "end_date": "tomorrow"},
+        {"op": "add", "task": "d", "start_date": "2024-13-45"},
+    ])
+
+    assert [r["ok"] for r in results] == [True, True, True] + [False] * 9
+    assert [r.get("error") for r in results[3:]] == [
+        "not found", "invalid id", "duplicate id in batch", "missing task text", "unknown operation",
+        "invalid end_date", "invalid start_date", "invalid end_date", "invalid start_date",
+    ]
+    assert len(task_model.get_tasks("bob")) == 1
+    assert {t["task"] for t in task_model.get_tasks("alice")} == {"task 0", "task 2", "new"}
+
+    stats = task_model.get_stats("alice")
+    assert counts(stats) == counts(task_model.rebuild_stats("alice"))
+    assert (stats["total"], stats["completed"]) == (3, 1)
+    assert third not in {r.get("id") for r in results}
+
+def test_import_tasks_validates_and_chunks(task_model):
+    rows = [
+        {"username": "alice", "task": "one", "completed": "true", "start_date": "2024-01-01", "end_date": "2000-01-01T10:00"},
+        {"username": "alice", "task": "two", "completed": "", "end_date": "2000-01-01T10:00"},
+        {"username": "bob", "task": "three", "completed": False},
+        {"username": "alice", "task": "bad date", "end_date": "01/02/2024"},
+        {"username": "alice", "task": ""},
+        {"task": "no owner"},
+        None,
+        {"username": "alice", "task": "numeric date", "end_date": 5},
+    ]
+    progress = []
+    result = task_model.import_tasks(iter(rows), chunk_size=2, progress=lambda *args: progress.append(args))
+
+    assert (result["imported"], result["failed"]) == (3, 5)
+    assert [error["row"] for error in result["errors"]] == [4, 5, 6, 7, 8]
+    assert result["errors"][-1]["error"] == "invalid end_date: 5"
+    assert [imported for imported, _, _ in progress] == [2, 3]
+    assert counts(task_model.get_stats("alice")) == (2, 1, 1)
+    assert counts(task_model.get_stats("bob")) == (1, 0, 0)
+
+def test_import_tasks_stops_on_unreadable_input(task_model):
+    def rows():
+        for i in range(3):
+            yield {"username": "alice", "task": f"t{i}"}
+        raise ValueError("bad bytes")
+
+    result = task_model.import_tasks(rows(), chunk_size=2)
+    assert (result["imported"], result["failed"], result["aborted"]) == (3, 0, True)
+    assert result["errors"] == [{"row": 4, "error": "unreadable input: bad bytes"}]
+    assert task_model.get_stats("alice")["total"] == 3
+
+def test_import_tasks_for_one_user(task_model):
+    result = task_model.import_tasks([{"username": "mallory", "task": "x"}], username="alice")
+    assert result["imported"] == 1
+    assert task_model.get_tasks("alice")[0]["task"] == "x"
+    assert task_model.get_tasks("mallory") == []
+
+def test_export_rows_round_trip(task_model):
+    task_model.add_task("alice", "one", "2024-01-01T09:00", "2024-01-02")
+    task_model.add_task("bob", "two")
+
+    rows = [task_model.export_row(task) for task in task_model.iter_tasks()]
+    assert rows[0] == {"username": "alice", "task": "one", "completed": False,
+                       "start_date": "2024-01-01T09:00", "end_date": "2024-01-02T00:00"}
+    assert [row["task"] for row in map(task_model.export_row, task_model.iter_tasks("bob"))] == ["two"]
+
+    task_model.tasks.delete_many({})
+    task_model.import_tasks(rows)
+    assert [task_model.export_row(task) for task in task_model.iter_tasks()] == rows